@@ -9,13 +9,47 @@ This script helps users set up School-MCP with Claude Desktop by:
 """
 
 import os
+import re
 import json
 import sys
-import shutil
-import subprocess
+from functools import lru_cache
 from pathlib import Path
-import site
 
+# Environment variables School-MCP needs to talk to Canvas and Gradescope
+_REQUIRED_ENV_VARS = ('CANVAS_ACCESS_TOKEN', 'CANVAS_DOMAIN', 'GRADESCOPE_EMAIL', 'GRADESCOPE_PASSWORD')
+
+# Matches a KEY=value line in a .env file, capturing the stripped key and value.
+# [^\S\n] is any whitespace except a newline, so matches never span lines.
+_ENV_LINE_PATTERN = re.compile(r'^[^\S\n]*((?:[^#=\s][^=\n]*?)?)[^\S\n]*=[^\S\n]*(.*?)[^\S\n]*$', re.M)
+
+# Placeholder credentials used for a freshly created .env file and the manual instructions
+_EXAMPLE_ENV = {
+    "CANVAS_ACCESS_TOKEN": "your_canvas_token_here",
+    "CANVAS_DOMAIN": "canvas.your_institution.edu",
+    "GRADESCOPE_EMAIL": "your_email@your_institution.edu",
+    "GRADESCOPE_PASSWORD": "your_gradescope_password"
+}
+
+_ENV_TEMPLATE = b"""# Canvas API credentials
+CANVAS_ACCESS_TOKEN=your_canvas_token_here
+CANVAS_DOMAIN=canvas.your_institution.edu
+
+# Gradescope credentials
+GRADESCOPE_EMAIL=your_email@your_institution.edu
+GRADESCOPE_PASSWORD=your_gradescope_password
+"""
+
+# Results of existence checks, keyed by path, so each path is stat'd once per run
+_exists_cache = {}
+
+def _cached_exists(path):
+    """Return os.path.exists(path), caching the result for the rest of the run"""
+    path = os.fspath(path)
+    if path not in _exists_cache:
+        _exists_cache[path] = os.path.exists(path)
+    return _exists_cache[path]
+
+@lru_cache(maxsize=None)
 def find_claude_config():
     """Find the Claude Desktop configuration file"""
     # Common locations for the Claude Desktop config file
@@ -23,86 +57,130 @@ def find_claude_config():
     
     # macOS
     if sys.platform == 'darwin':
-        possible_locations.append(Path.home() / "Library/Application Support/Claude/claude_desktop_config.json")
+        possible_locations.append(os.path.join(os.path.expanduser('~'), "Library", "Application Support", "Claude", "claude_desktop_config.json"))
     
     # Windows
     elif sys.platform == 'win32':
         app_data = os.environ.get('APPDATA', '')
         if app_data:
-            possible_locations.append(Path(app_data) / "Claude/claude_desktop_config.json")
+            possible_locations.append(os.path.join(app_data, "Claude", "claude_desktop_config.json"))
     
     # Linux
     else:
-        config_home = os.environ.get('XDG_CONFIG_HOME', Path.home() / '.config')
-        possible_locations.append(Path(config_home) / "Claude/claude_desktop_config.json")
+        config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+        possible_locations.append(os.path.join(config_home, "Claude", "claude_desktop_config.json"))
     
-    # Check all possible locations
-    for location in possible_locations:
-        if location.exists():
-            return location
+    # Check all possible locations, skipping duplicates
+    for location in dict.fromkeys(possible_locations):
+        if os.path.isfile(location):
+            return Path(location)
     
     return None
 
+# Directories never worth descending into when searching for the package;
+# hidden directories such as .git and .venv are skipped as well
+_SKIPPED_DIRS = frozenset(['node_modules', 'venv'])
+
+def _searchable_subdirs(path):
+    """List the subdirectories of path that the package search should descend into"""
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it
+                    if entry.is_dir() and not entry.name.startswith('.') and entry.name not in _SKIPPED_DIRS]
+    except OSError:
+        return []
+
+@lru_cache(maxsize=None)
 def get_package_path():
     """Get the path to the school_mcp package"""
+    import site
+    import sysconfig
+    
     try:
         # Try to import the module to see if it's installed
         import school_mcp
         return os.path.dirname(os.path.abspath(school_mcp.__file__))
     except ImportError:
-        # If the module isn't importable, search in site-packages
-        for site_dir in site.getsitepackages():
-            potential_path = os.path.join(site_dir, 'school_mcp')
-            if os.path.exists(potential_path):
-                return potential_path
+        # If the module isn't importable, search in site-packages, most likely locations first
+        site_dirs = [site.getusersitepackages(), sysconfig.get_paths()['purelib']] + site.getsitepackages()
+        potential_path = next(
+            (path for path in (os.path.join(site_dir, 'school_mcp') for site_dir in site_dirs)
+             if _cached_exists(path)),
+            None
+        )
+        if potential_path:
+            return potential_path
         
         # If not found in site-packages, check if it's in the current directory
         current_dir = os.getcwd()
         src_path = os.path.join(current_dir, 'src', 'school_mcp')
-        if os.path.exists(src_path):
+        if _cached_exists(src_path):
             return src_path
         
-        # Last resort: search in the directory structure
-        for root, dirs, files in os.walk(current_dir):
-            if 'school_mcp' in dirs:
-                return os.path.join(root, 'school_mcp')
+        package_dir = os.path.join(current_dir, 'school_mcp')
+        if _cached_exists(package_dir):
+            return package_dir
+
+        # Last resort: look a couple of levels down instead of walking the whole tree
+        top_dirs = _searchable_subdirs(current_dir)
+        for parent in top_dirs:
+            candidate = os.path.join(parent, 'school_mcp')
+            if os.path.isdir(candidate):
+                return candidate
+        for top_dir in top_dirs:
+            for parent in _searchable_subdirs(top_dir):
+                candidate = os.path.join(parent, 'school_mcp')
+                if os.path.isdir(candidate):
+                    return candidate
     
     return None
 
+# Checks for the package without executing its __init__.py
+_FIND_PACKAGE_SNIPPET = "import importlib.util, sys; sys.exit(0 if importlib.util.find_spec('school_mcp') else 1)"
+
+def _has_school_mcp(python_path):
+    """Check whether the given Python interpreter can import school_mcp"""
+    import subprocess
+    
+    try:
+        result = subprocess.run([python_path, "-c", _FIND_PACKAGE_SNIPPET], capture_output=True)
+        return result.returncode == 0
+    except Exception:
+        return False
+
+@lru_cache(maxsize=None)
 def find_python_executable():
     """Find the Python executable that has school_mcp installed"""
+    import shutil
+    
     # First, try the current Python executable
     current_python = sys.executable
-    try:
-        # Check if school_mcp is importable with this Python
-        result = subprocess.run(
-            [current_python, "-c", "import school_mcp; print('Found')"],
-            capture_output=True, text=True
-        )
-        if "Found" in result.stdout:
-            return current_python
-    except Exception:
-        pass
+    if _has_school_mcp(current_python):
+        return current_python
     
-    # Try common Python executables
+    # Try common Python executables, skipping paths already checked. Symlinks are
+    # deliberately not resolved: a venv's python links to the base interpreter
+    # but has its own site-packages.
+    seen = {os.path.normcase(os.path.abspath(current_python))}
     for python_cmd in ["python", "python3", "python3.8", "python3.9", "python3.10", "python3.11"]:
-        try:
-            python_path = shutil.which(python_cmd)
-            if python_path:
-                result = subprocess.run(
-                    [python_path, "-c", "import school_mcp; print('Found')"],
-                    capture_output=True, text=True
-                )
-                if "Found" in result.stdout:
-                    return python_path
-        except Exception:
+        python_path = shutil.which(python_cmd)
+        if not python_path:
             continue
+        normalized_path = os.path.normcase(os.path.abspath(python_path))
+        if normalized_path in seen:
+            continue
+        seen.add(normalized_path)
+        if _has_school_mcp(python_path):
+            return python_path
     
     # If we can't find a Python with school_mcp, return the current one
     return sys.executable
 
+@lru_cache(maxsize=None)
 def get_script_path():
     """Find the path to the school-mcp script"""
+    import shutil
+    
     # Look for the script in common locations
     script_name = "school-mcp"
     if sys.platform == 'win32':
@@ -118,7 +196,7 @@ def get_script_path():
     scripts_dir = os.path.join(os.path.dirname(python_path), "Scripts" if sys.platform == 'win32' else "bin")
     potential_script = os.path.join(scripts_dir, script_name)
     
-    if os.path.exists(potential_script):
+    if _cached_exists(potential_script):
         return potential_script
     
     # If we can't find the script, we'll use the Python module approach
@@ -130,16 +208,28 @@ def load_env_file(env_path):
     
     if os.path.exists(env_path):
         with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                    
-                key, value = line.split('=', 1)
-                env_vars[key.strip()] = value.strip()
+            data = f.read()
+        
+        # Comments, blank lines and lines without an assignment never match
+        for key, value in _ENV_LINE_PATTERN.findall(data):
+            if key not in env_vars:
+                # The first definition of a variable wins
+                env_vars[key] = value
     
     return env_vars
 
+def read_config(config_file):
+    """Read the Claude Desktop configuration from disk"""
+    with open(config_file, 'r') as f:
+        return json.load(f)
+
+def write_config(config_file, config):
+    """Write the Claude Desktop configuration to disk"""
+    # Serialize before opening the file so a failure can't leave it truncated
+    data = json.dumps(config, indent=2)
+    with open(config_file, 'w') as f:
+        f.write(data)
+
 def setup_claude_config():
     """Set up the Claude Desktop configuration for School-MCP"""
     config_file = find_claude_config()
@@ -154,8 +244,7 @@ def setup_claude_config():
     
     # Read the existing config
     try:
-        with open(config_file, 'r') as f:
-            config = json.load(f)
+        config = read_config(config_file)
     except (json.JSONDecodeError, FileNotFoundError):
         # If the file doesn't exist or is not valid JSON, start with an empty config
         config = {}
@@ -180,14 +269,16 @@ def setup_claude_config():
     else:
         print(f"Using Python module approach with package at: {package_path}")
     
-    # Look for .env file
+    # Look for .env file. This function may create it, so its existence is
+    # checked directly rather than through the cache.
     env_path = os.path.join(os.getcwd(), '.env')
     if not os.path.exists(env_path):
         # Try copying from template
         template_path = os.path.join(os.getcwd(), '.env.template')
-        if os.path.exists(template_path):
+        if _cached_exists(template_path):
             use_template = input(f"\n.env file not found. Create from template? [Y/n]: ").strip().lower()
             if not use_template or use_template in ('y', 'yes'):
+                import shutil
                 shutil.copy(template_path, env_path)
                 print(f"Created .env file from template. Please edit {env_path} with your credentials.")
                 print("After editing, run this script again.")
@@ -200,8 +291,7 @@ def setup_claude_config():
         print(f"\nLoaded environment variables from {env_path}")
         
         # Check if credentials are set
-        required_vars = ['CANVAS_ACCESS_TOKEN', 'CANVAS_DOMAIN', 'GRADESCOPE_EMAIL', 'GRADESCOPE_PASSWORD']
-        missing_vars = [var for var in required_vars if var not in env_vars]
+        missing_vars = [var for var in _REQUIRED_ENV_VARS if var not in env_vars]
         
         if missing_vars:
             print(f"Warning: Missing required environment variables: {', '.join(missing_vars)}")
@@ -214,15 +304,8 @@ def setup_claude_config():
         print("\nNo .env file found.")
         create_env = input("Create .env file now? [Y/n]: ").strip().lower()
         if not create_env or create_env in ('y', 'yes'):
-            with open(env_path, 'w') as f:
-                f.write("""# Canvas API credentials
-CANVAS_ACCESS_TOKEN=your_canvas_token_here
-CANVAS_DOMAIN=canvas.your_institution.edu
-
-# Gradescope credentials
-GRADESCOPE_EMAIL=your_email@your_institution.edu
-GRADESCOPE_PASSWORD=your_gradescope_password
-""")
+            with open(env_path, 'wb') as f:
+                f.write(_ENV_TEMPLATE)
             print(f"Created .env file. Please edit {env_path} with your credentials.")
             print("After editing, run this script again.")
             return False
@@ -249,8 +332,7 @@ GRADESCOPE_PASSWORD=your_gradescope_password
     
     # Write the updated config back to the file
     try:
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+        write_config(config_file, config)
         
         print("\nSuccessfully updated Claude Desktop configuration!")
         print("School-MCP has been configured as 'school-tools' in Claude Desktop.")
@@ -258,13 +340,15 @@ GRADESCOPE_PASSWORD=your_gradescope_password
         return True
     except Exception as e:
         print(f"Error updating configuration file: {str(e)}")
-        print_manual_instructions()
+        print_manual_instructions(script_path, python_path)
         return False
 
-def print_manual_instructions():
+def print_manual_instructions(script_path=None, python_path=None):
     """Print instructions for manual configuration"""
-    script_path = get_script_path()
-    python_path = find_python_executable()
+    if script_path is None:
+        script_path = get_script_path()
+    if python_path is None:
+        python_path = find_python_executable()
     
     print("\nManual Configuration Instructions:")
     print("1. Open Claude Desktop")
@@ -273,34 +357,11 @@ def print_manual_instructions():
     
     # Create config example based on what we found
     if script_path:
-        config_example = {
-            "mcpServers": {
-                "school-tools": {
-                    "command": script_path,
-                    "env": {
-                        "CANVAS_ACCESS_TOKEN": "your_canvas_token_here",
-                        "CANVAS_DOMAIN": "canvas.your_institution.edu",
-                        "GRADESCOPE_EMAIL": "your_email@your_institution.edu",
-                        "GRADESCOPE_PASSWORD": "your_gradescope_password"
-                    }
-                }
-            }
-        }
+        server_example = {"command": script_path}
     else:
-        config_example = {
-            "mcpServers": {
-                "school-tools": {
-                    "command": python_path,
-                    "args": ["-m", "school_mcp"],
-                    "env": {
-                        "CANVAS_ACCESS_TOKEN": "your_canvas_token_here",
-                        "CANVAS_DOMAIN": "canvas.your_institution.edu",
-                        "GRADESCOPE_EMAIL": "your_email@your_institution.edu",
-                        "GRADESCOPE_PASSWORD": "your_gradescope_password"
-                    }
-                }
-            }
-        }
+        server_example = {"command": python_path, "args": ["-m", "school_mcp"]}
+    server_example["env"] = _EXAMPLE_ENV
+    config_example = {"mcpServers": {"school-tools": server_example}}
     
     print(json.dumps(config_example, indent=4))
     print("\n4. Replace the environment variable values with your actual credentials.")